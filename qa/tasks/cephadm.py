@@ -143,40 +143,50 @@ def download_cephadm(ctx, config, ref):
             # git archive doesn't like https:// URLs, which we use with github.
             rest = git_url.split('https://github.com/', 1)[1]
             rest = re.sub(r'\.git/?$', '', rest).strip() # no .git suffix
-            ctx.cluster.run(
-                args=[
-                    'curl', '--silent',
-                    'https://raw.githubusercontent.com/' + rest + '/' + ref + '/src/cephadm/cephadm',
-                    run.Raw('>'),
-                    ctx.cephadm,
-                    run.Raw('&&'),
-                    'ls', '-l',
-                    ctx.cephadm,
-                ],
+            # download on all remotes at once rather than one at a time
+            run.wait(
+                ctx.cluster.run(
+                    args=[
+                        'curl', '--silent', '--fail',
+                        'https://raw.githubusercontent.com/' + rest + '/' + ref + '/src/cephadm/cephadm',
+                        run.Raw('>'),
+                        ctx.cephadm,
+                        run.Raw('&&'),
+                        'ls', '-l',
+                        ctx.cephadm,
+                    ],
+                    wait=False,
+                )
             )
         else:
+            run.wait(
+                ctx.cluster.run(
+                    args=[
+                        'git', 'archive',
+                        '--remote=' + git_url,
+                        ref,
+                        'src/cephadm/cephadm',
+                        run.Raw('|'),
+                        'tar', '-xO', 'src/cephadm/cephadm',
+                        run.Raw('>'),
+                        ctx.cephadm,
+                    ],
+                    wait=False,
+                )
+            )
+        # sanity-check the resulting file and set executable bit
+        cephadm_file_size = '$(stat -c%s {})'.format(ctx.cephadm)
+        run.wait(
             ctx.cluster.run(
                 args=[
-                    'git', 'archive',
-                    '--remote=' + git_url,
-                    ref,
-                    'src/cephadm/cephadm',
-                    run.Raw('|'),
-                    'tar', '-xO', 'src/cephadm/cephadm',
-                    run.Raw('>'),
-                    ctx.cephadm,
+                    'test', '-s', ctx.cephadm,
+                    run.Raw('&&'),
+                    'test', run.Raw(cephadm_file_size), "-gt", run.Raw('1000'),
+                    run.Raw('&&'),
+                    'chmod', '+x', ctx.cephadm,
                 ],
+                wait=False,
             )
-        # sanity-check the resulting file and set executable bit
-        cephadm_file_size = '$(stat -c%s {})'.format(ctx.cephadm)
-        ctx.cluster.run(
-            args=[
-                'test', '-s', ctx.cephadm,
-                run.Raw('&&'),
-                'test', run.Raw(cephadm_file_size), "-gt", run.Raw('1000'),
-                run.Raw('&&'),
-                'chmod', '+x', ctx.cephadm,
-            ],
         )
 
     try:
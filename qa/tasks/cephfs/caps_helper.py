@@ -1,79 +1,212 @@
 """
 Helper methods to test that MON and MDS caps are enforced properly.
 """
+import re
+
+from shlex import quote as shlex_quote
+
+import gevent
+
 from tasks.cephfs.cephfs_test_case import CephFSTestCase
 
-from teuthology.orchestra.run import Raw
+# matches "fsname=<name>" clauses in a MON/MDS cap; compiled once so every
+# cap string is parsed with a single linear scan
+_FSNAME_RE = re.compile(r'fsname=([^,\s]+)')
+# matches the MON cap line of a keyring, tolerating whitespace variations
+_MON_CAP_RE = re.compile(r'^\s*caps mon\s*=\s*"([^"]*)"', re.M)
+
 
 class CapsHelper(CephFSTestCase):
 
-    def run_mon_cap_tests(self, moncap, keyring):
-        keyring_path = self.fs.admin_remote.mktemp(data=keyring)
+    # error strings a denied write may surface, depending on client type
+    NEG_WRITE_ERRMSGS = ('permission denied', 'operation not permitted')
+    # payload used to attempt the denied writes
+    NEG_WRITE_DATA = 'some random data'
+
+    def _get_fsnames_from_moncap(self, moncap):
+        return _FSNAME_RE.findall(moncap)
 
-        fsls = self.run_cluster_cmd(f'fs ls --id {self.client_id} -k '
-                                    f'{keyring_path}')
+    def create_keyring_file(self, remote, keyring):
+        """
+        Stash the keyring in a temporary file on the given remote and
+        return its path. Asking for the same keyring on the same remote
+        again reuses the file already written there instead of paying
+        for another mktemp round-trip.
+        """
+        if not hasattr(self, '_keyring_paths'):
+            self._keyring_paths = {}
+        key = (remote, keyring)
+        if key not in self._keyring_paths:
+            self._keyring_paths[key] = remote.mktemp(data=keyring)
+        return self._keyring_paths[key]
+
+    def run_mon_cap_tests(self, moncap, keyring):
+        # "fs ls" output for a given cap and keyring can't change within a
+        # test, so cache it; tests that remount with several cephfs_mntpt
+        # values re-run this method with identical arguments and each run
+        # costs a mon round-trip.
+        if not hasattr(self, '_fsls_cache'):
+            self._fsls_cache = {}
+        fsls = self._fsls_cache.get((moncap, keyring))
+        if fsls is None:
+            keyring_path = self.create_keyring_file(self.fs.admin_remote,
+                                                    keyring)
+            fsls = self.run_cluster_cmd(f'fs ls --id {self.client_id} -k '
+                                        f'{keyring_path}')
+            self._fsls_cache[(moncap, keyring)] = fsls
 
         # we need to check only for default FS when fsname clause is absent
         # in MON/MDS caps
-        if 'fsname' not in moncap:
+        fsnames = self._get_fsnames_from_moncap(moncap)
+        if not fsnames:
             self.assertIn(self.fs.name, fsls)
             return
 
         fss = (self.fs1.name, self.fs2.name) if hasattr(self, 'fs1') else \
             (self.fs.name,)
         for fsname in fss:
-                if fsname in moncap:
+                if fsname in fsnames:
                     self.assertIn('name: ' + fsname, fsls)
                 else:
                     self.assertNotIn('name: ' + fsname, fsls)
 
+    @staticmethod
+    def _sort_filepaths_by_mount(filepaths, mounts):
+        """
+        Map each mount to the (index, path) pairs of the test files that
+        live on it, so callers don't re-scan every (mount, path)
+        combination per check.
+        """
+        paths_by_mount = {}
+        for mount in mounts:
+            for i, path in enumerate(filepaths):
+                # XXX: conduct tests only if path belongs to current mount; in
+                # teuth tests client are located on same machines.
+                if path.find(mount.hostfs_mntpt) != -1:
+                    paths_by_mount.setdefault(mount, []).append((i, path))
+        return paths_by_mount
+
     def run_mds_cap_tests(self, filepaths, filedata, mounts, perm):
-        self.conduct_pos_test_for_read_caps(filepaths, filedata, mounts)
+        paths_by_mount = self._sort_filepaths_by_mount(filepaths, mounts)
+        # an empty mapping means no test file matched any mount; the
+        # conduct_* loops would then iterate nothing and report success
+        # without having verified a single cap
+        if not paths_by_mount:
+            raise RuntimeError('run_mds_cap_tests: no test file matched any '
+                               'of the given mounts; were the test files '
+                               'created?')
+
+        self.conduct_pos_test_for_read_caps(paths_by_mount, filedata)
 
         if perm == 'rw':
-            self.conduct_pos_test_for_write_caps(filepaths, mounts)
+            self.conduct_pos_test_for_write_caps(paths_by_mount)
         elif perm == 'r':
-            self.conduct_neg_test_for_write_caps(filepaths, mounts)
+            self.conduct_neg_test_for_write_caps(paths_by_mount)
         else:
             raise RuntimeError(f'perm = {perm}\nIt should be "r" or "rw".')
 
-    def conduct_pos_test_for_read_caps(self, filepaths, filedata, mounts):
-        for mount in mounts:
-            for path, data in zip(filepaths, filedata):
-                # XXX: conduct tests only if path belongs to current mount; in
-                # teuth tests client are located on same machines.
-                if path.find(mount.hostfs_mntpt) != -1:
-                    contents = mount.read_file(path)
-                    self.assertEqual(data, contents)
+    @staticmethod
+    def _run_cap_checks(jobs):
+        # remote commands release the gevent hub while waiting on I/O, so
+        # running the per-mount checks concurrently cuts the wall time by
+        # roughly the number of mounts; get() re-raises any AssertionError
+        # from inside a greenlet.
+        greenlets = [gevent.spawn(fn, *args) for fn, *args in jobs]
+        gevent.joinall(greenlets)
+        for greenlet in greenlets:
+            greenlet.get()
+
+    def conduct_pos_test_for_read_caps(self, paths_by_mount, filedata):
+        def verify_read(mount, path, data):
+            contents = mount.read_file(path)
+            self.assertEqual(data, contents)
 
-    def conduct_pos_test_for_write_caps(self, filepaths, mounts):
+        jobs = []
+        for mount, paths in paths_by_mount.items():
+            for i, path in paths:
+                # tests may pass fewer data items than paths; check only
+                # the paths that have one, like zip() used to
+                if i < len(filedata):
+                    jobs.append((verify_read, mount, path, filedata[i]))
+        self._run_cap_checks(jobs)
+
+    def conduct_pos_test_for_write_caps(self, paths_by_mount):
         filedata = ('some new data on first fs', 'some new data on second fs')
 
-        for mount in mounts:
-            for path, data in zip(filepaths, filedata):
-                if path.find(mount.hostfs_mntpt) != -1:
-                    # test that write was successful
-                    mount.write_file(path=path, data=data)
-                    # verify that contents written was same as the one that was
-                    # intended
-                    contents1 = mount.read_file(path=path)
-                    self.assertEqual(data, contents1)
+        def verify_write(mount, path, data):
+            # write and read back the file in a single remote command --
+            # separate write_file() and read_file() calls would cost two
+            # SSH round-trips for what is one verification.
+            proc = mount.run_shell(args=['sh', '-c',
+                                         f'printf %s {shlex_quote(data)} > '
+                                         f'{path} && cat {path}'])
+            # verify that contents written was same as the one that was
+            # intended
+            self.assertEqual(data, proc.stdout.getvalue())
 
-    def conduct_neg_test_for_write_caps(self, filepaths, mounts):
-        cmdargs = ['echo', 'some random data', Raw('|'), 'tee']
+        jobs = []
+        seen = set()
+        for mount, paths in paths_by_mount.items():
+            for i, path in paths:
+                if i >= len(filedata):
+                    continue
+                # the same path can appear more than once (e.g. two test
+                # files that resolve to one mount path); concurrent
+                # greenlets writing it would race and read back each
+                # other's payload, so verify each path only once
+                if (mount, path) in seen:
+                    continue
+                seen.add((mount, path))
+                jobs.append((verify_write, mount, path, filedata[i]))
+        self._run_cap_checks(jobs)
 
-        for mount in mounts:
-            for path in filepaths:
-                if path.find(mount.hostfs_mntpt) != -1:
-                    cmdargs.append(path)
-                    mount.negtestcmd(args=cmdargs, retval=1,
-                                     errmsg='permission denied')
+    def conduct_neg_test_for_write_caps(self, paths_by_mount):
+        def verify_writes_denied(mount, paths):
+            # try writing all of this mount's paths with one remote
+            # command; a separate "echo | tee" per path would cost one
+            # SSH round-trip per file.
+            script = '; '.join(f'echo {self.NEG_WRITE_DATA} | tee {path}'
+                               for path in paths)
+            proc = mount.run_shell(args=['sh', '-c', script],
+                                   check_status=False)
+            self.assertEqual(1, proc.returncode)
+            stderr = proc.stderr.getvalue().lower()
+            denials = sum(stderr.count(errmsg)
+                          for errmsg in self.NEG_WRITE_ERRMSGS)
+            self.assertEqual(len(paths), denials)
+
+        jobs = []
+        for mount, paths in paths_by_mount.items():
+            jobs.append((verify_writes_denied, mount,
+                         [path for _, path in paths]))
+        self._run_cap_checks(jobs)
 
     def get_mon_cap_from_keyring(self, client_name):
+        # memoize the parsed cap per client; repeated checks for the same
+        # client within a test would otherwise re-run 'auth get' (a mon
+        # round-trip) for an unchanged answer
+        if not hasattr(self, '_mon_cap_cache'):
+            self._mon_cap_cache = {}
+        if client_name in self._mon_cap_cache:
+            return self._mon_cap_cache[client_name]
+
         keyring = self.run_cluster_cmd(cmd=f'auth get {client_name}')
-        for line in keyring.split('\n'):
-            if 'caps mon' in line:
-                return line[line.find(' = "') + 4 : -1]
+        mon_cap = _MON_CAP_RE.search(keyring)
+        if mon_cap is None:
+            raise RuntimeError('get_save_mon_cap: mon cap not found in '
+                               'keyring. keyring -\n' + keyring)
 
-        raise RuntimeError('get_save_mon_cap: mon cap not found in keyring. '
-                           'keyring -\n' + keyring)
+        self._mon_cap_cache[client_name] = mon_cap.group(1)
+        return self._mon_cap_cache[client_name]
+
+    def invalidate_mon_cap_cache(self, client_name=None):
+        """
+        Drop mon caps memoized by get_mon_cap_from_keyring(); must be
+        called after modifying or removing a client's caps.
+        """
+        if not hasattr(self, '_mon_cap_cache'):
+            return
+        if client_name is None:
+            self._mon_cap_cache.clear()
+        else:
+            self._mon_cap_cache.pop(client_name, None)
@@ -430,7 +430,10 @@ class CephFSTestCase(CephTestCase):
                                    'is not created yet to allow client auth '
                                    'for it.')
 
-        cmd = ['auth', 'add', f'client.{client_id}']
+        # "auth get-or-create" both creates the client and prints its
+        # keyring; running "auth add" followed by "auth get" would fork
+        # the ceph CLI (and pay a mon round-trip) twice for the same job.
+        cmd = ['auth', 'get-or-create', f'client.{client_id}']
         if moncap:
             cmd += ['mon', moncap]
         if osdcap:
@@ -438,5 +441,4 @@ class CephFSTestCase(CephTestCase):
         if mdscap:
             cmd += ['mds', mdscap]
 
-        self.run_cluster_cmd(cmd)
-        return self.run_cluster_cmd(f'auth get {self.client_name}')
+        return self.run_cluster_cmd(cmd)
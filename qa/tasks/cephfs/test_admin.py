@@ -5,6 +5,7 @@ import time
 import uuid
 from io import StringIO
 from os.path import join as os_path_join
+from shlex import quote as shlex_quote
 
 from teuthology.orchestra.run import Raw
 from teuthology.exceptions import CommandFailedError
@@ -510,7 +511,7 @@ class TestDump(CephFSTestCase):
         time.sleep(10) # for tick/compaction
 
         status = self.fs.status()
-        log.debug(f"new epoch is {status['epoch']}")
+        log.debug("new epoch is %s", status['epoch'])
         self.fs.status(epoch=epoch+1) # epoch+1 is not trimmed, may not == status["epoch"]
 
         try:
@@ -617,7 +618,7 @@ class TestCompatCommands(CephFSTestCase):
         self.fs.fail()
         self.fs.add_incompat(63, 'placeholder')
         mdsmap = self.fs.get_mds_map()
-        log.info(f"{mdsmap}")
+        log.info("%s", mdsmap)
         self.assertIn("feature_63", mdsmap['compat']['incompat'])
 
     def test_rm_compat(self):
@@ -933,7 +934,7 @@ class TestFsAuthorize(CapsHelper):
         self.mount_a.write_file(filepath, filedata)
 
         keyring = self.fs.authorize(self.client_id, ('/', 'rw', 'root_squash'))
-        keyring_path = self.mount_a.client_remote.mktemp(data=keyring)
+        keyring_path = self.create_keyring_file(self.mount_a.client_remote, keyring)
         self.mount_a.remount(client_id=self.client_id,
                              client_keyring_path=keyring_path,
                              cephfs_mntpt='/')
@@ -968,7 +969,7 @@ class TestFsAuthorize(CapsHelper):
         filepaths, filedata, mounts, keyring = self.setup_test_env(perm, paths)
         moncap = self.get_mon_cap_from_keyring(self.client_name)
 
-        keyring_path = self.mount_a.client_remote.mktemp(data=keyring)
+        keyring_path = self.create_keyring_file(self.mount_a.client_remote, keyring)
         for path in paths:
             self.mount_a.remount(client_id=self.client_id,
                                  client_keyring_path=keyring_path,
@@ -984,7 +985,7 @@ class TestFsAuthorize(CapsHelper):
         filepaths, filedata, mounts, keyring = self.setup_test_env(perm, paths)
         moncap = self.get_mon_cap_from_keyring(self.client_name)
 
-        keyring_path = self.mount_a.client_remote.mktemp(data=keyring)
+        keyring_path = self.create_keyring_file(self.mount_a.client_remote, keyring)
         for path in paths:
             self.mount_a.remount(client_id=self.client_id,
                                  client_keyring_path=keyring_path,
@@ -1008,7 +1009,7 @@ class TestFsAuthorize(CapsHelper):
         self.mount_a.write_file(filepath, filedata)
 
         keyring = self.fs.authorize(self.client_id, ('/', perm))
-        keyring_path = self.mount_a.client_remote.mktemp(data=keyring)
+        keyring_path = self.create_keyring_file(self.mount_a.client_remote, keyring)
 
         self.mount_a.remount(client_id=self.client_id,
                              client_keyring_path=keyring_path,
@@ -1019,13 +1020,21 @@ class TestFsAuthorize(CapsHelper):
     def setup_for_multiple_paths(self, perm, paths):
         filedata, filename = 'some data on fs 1', 'file_on_fs1'
 
-        self.mount_a.run_shell('mkdir -p dir1/dir12/dir13 dir2/dir22/dir23')
-
-        filepaths = []
+        # create the directories and write all test files in a single
+        # remote command; each remote command costs a full SSH round-trip.
+        # quote the payload once and reuse it for every file instead of
+        # re-escaping the same string per path
+        quoted_filedata = shlex_quote(filedata)
+        filepaths, writecmds = [], ['mkdir -p dir1/dir12/dir13 dir2/dir22/dir23']
         for path in paths:
-            filepath = os_path_join(self.mount_a.hostfs_mntpt, path[1:], filename)
-            self.mount_a.write_file(filepath, filedata)
-            filepaths.append(filepath.replace(path, ''))
+            # build both the absolute path and the path the client sees
+            # after remounting with cephfs_mntpt=path from their parts;
+            # deriving the latter with str.replace() would also rewrite
+            # an occurrence of the mntpt in the middle of the path.
+            abspath = os_path_join(self.mount_a.hostfs_mntpt, path[1:], filename)
+            writecmds.append(f'printf %s {quoted_filedata} > {abspath}')
+            filepaths.append(os_path_join(self.mount_a.hostfs_mntpt, filename))
+        self.mount_a.run_shell(args=['sh', '-c', ' && '.join(writecmds)])
         filepaths = tuple(filepaths)
 
         keyring = self.fs.authorize(self.client_id, (paths[0], perm, paths[1],
@@ -1087,9 +1096,9 @@ class TestAdminCommandDumpTree(CephFSTestCase):
         """
 
         subtrees = self.fs.mds_asok(['get', 'subtrees'])
-        log.info(f"dumping {len(subtrees)} subtrees:")
+        log.info("dumping %d subtrees:", len(subtrees))
         for subtree in subtrees:
-            log.info(f"  subtree: '{subtree['dir']['path']}'")
+            log.info("  subtree: '%s'", subtree['dir']['path'])
             self.fs.mds_asok(['dump', 'tree', subtree['dir']['path']])
 
         log.info("dumping 2 special subtrees:")
@@ -4,6 +4,7 @@ Test for Ceph clusters with multiple FSs.
 import logging
 
 from os.path import join as os_path_join
+from shlex import quote as shlex_quote
 
 # CapsHelper is subclassed from CephFSTestCase
 from tasks.cephfs.caps_helper import CapsHelper
@@ -149,24 +150,25 @@ class TestMDSCaps(TestMultiFS):
         return filepaths, filedata, mounts
 
     def generate_caps(self, perm, fsname, cephfs_mntpt):
+        # build each cap as a join of per-FS clauses instead of spelling
+        # out every fsname/mntpt combination by hand
+        def gen_mdscap_str(fs_name):
+            mdscap = f'allow {perm}'
+            if fs_name:
+                mdscap += f' fsname={fs_name}'
+            if cephfs_mntpt != '/':
+                mdscap += f' path=/{cephfs_mntpt}'
+            return mdscap
+
         moncap = 'allow r'
-        osdcap = (f'allow {perm} tag cephfs data={self.fs1.name}, '
-                  f'allow {perm} tag cephfs data={self.fs2.name}')
+        osdcap = ', '.join(f'allow {perm} tag cephfs data={fs_name}'
+                           for fs_name in (self.fs1.name, self.fs2.name))
 
         if fsname:
-            if cephfs_mntpt == '/':
-                mdscap = (f'allow {perm} fsname={self.fs1.name}, '
-                          f'allow {perm} fsname={self.fs2.name}')
-            else:
-                mdscap = (f'allow {perm} fsname={self.fs1.name} '
-                          f'path=/{cephfs_mntpt}, '
-                          f'allow {perm} fsname={self.fs2.name} '
-                          f'path=/{cephfs_mntpt}')
+            mdscap = ', '.join(gen_mdscap_str(fs_name)
+                               for fs_name in (self.fs1.name, self.fs2.name))
         else:
-            if cephfs_mntpt == '/':
-                mdscap = f'allow {perm}'
-            else:
-                mdscap = f'allow {perm} path=/{cephfs_mntpt}'
+            mdscap = gen_mdscap_str(None)
 
         return moncap, osdcap, mdscap
 
@@ -177,23 +179,35 @@ class TestMDSCaps(TestMultiFS):
         keyring = self.create_client(self.client_id, moncap, osdcap, mdscap)
         keyring_paths = []
         for mount_x in (self.mount_a, self.mount_b):
-            keyring_paths.append(mount_x.client_remote.mktemp(data=keyring))
+            keyring_paths.append(self.create_keyring_file(
+                mount_x.client_remote, keyring))
 
         return keyring_paths
 
     def setup_fs_contents(self, cephfs_mntpt, filenames, filedata):
         filepaths = []
+        procs = []
         iter_on = zip((self.mount_a, self.mount_b), filenames, filedata)
 
+        # write the test file on each mount with a single remote command
+        # (instead of a "mkdir" followed by a separate write) and let the
+        # mounts run in parallel; each remote command is a full SSH
+        # round-trip, which dominates the runtime for tiny files like these.
         for mount_x, filename, data in iter_on:
             if cephfs_mntpt != '/' :
-                mount_x.run_shell(args=['mkdir', cephfs_mntpt])
                 filepaths.append(os_path_join(mount_x.hostfs_mntpt,
                                               cephfs_mntpt, filename))
+                cmd = (f'mkdir -p {cephfs_mntpt} && printf %s '
+                       f'{shlex_quote(data)} > {filepaths[-1]}')
             else:
                 filepaths.append(os_path_join(mount_x.hostfs_mntpt, filename))
+                cmd = f'printf %s {shlex_quote(data)} > {filepaths[-1]}'
 
-            mount_x.write_file(filepaths[-1], data)
+            procs.append(mount_x.run_shell(args=['sh', '-c', cmd],
+                                           wait=False))
+
+        for proc in procs:
+            proc.wait()
 
     def remount_with_new_client(self, cephfs_mntpt, filenames,
                                            keyring_paths):
@@ -221,36 +235,36 @@ class TestMDSCaps(TestMultiFS):
 
 class TestClientsWithoutAuth(TestMultiFS):
 
+    # TODO: When MON and OSD caps for a Ceph FS are assigned to a
+    # client but MDS caps are not, mount.ceph prints "permission
+    # denied". But when MON caps are not assigned and MDS and OSD
+    # caps are, mount.ceph prints "no mds server or cluster laggy"
+    # instead of "permission denied".
+    #
+    # Before uncommenting the following line a fix would be required
+    # for latter case to change "no mds server is up or the cluster is
+    #  laggy" to "permission denied".
+    kernel_errmsgs = ('permission denied', 'no mds server is up or '
+                      'the cluster is laggy', 'no such file or '
+                      'directory',
+                      'input/output error')
+
+    # TODO: When MON and OSD caps are assigned for a Ceph FS to a
+    # client but MDS caps are not, ceph-fuse prints "operation not
+    # permitted". But when MON caps are not assigned and MDS and OSD
+    # caps are, ceph-fuse prints "no such file or directory" instead
+    # of "operation not permitted".
+    #
+    # Before uncommenting the following line a fix would be required
+    # for the latter case to change "no such file or directory" to
+    # "operation not permitted".
+    #self.assertIn('operation not permitted', retval[2].lower())
+    fuse_errmsgs = ('operation not permitted', 'no such file or '
+                    'directory')
+
     def setUp(self):
         super(TestClientsWithoutAuth, self).setUp()
 
-        # TODO: When MON and OSD caps for a Ceph FS are assigned to a
-        # client but MDS caps are not, mount.ceph prints "permission
-        # denied". But when MON caps are not assigned and MDS and OSD
-        # caps are, mount.ceph prints "no mds server or cluster laggy"
-        # instead of "permission denied".
-        #
-        # Before uncommenting the following line a fix would be required
-        # for latter case to change "no mds server is up or the cluster is
-        #  laggy" to "permission denied".
-        self.kernel_errmsgs = ('permission denied', 'no mds server is up or '
-                               'the cluster is laggy', 'no such file or '
-                               'directory',
-                               'input/output error')
-
-        # TODO: When MON and OSD caps are assigned for a Ceph FS to a
-        # client but MDS caps are not, ceph-fuse prints "operation not
-        # permitted". But when MON caps are not assigned and MDS and OSD
-        # caps are, ceph-fuse prints "no such file or directory" instead
-        # of "operation not permitted".
-        #
-        # Before uncommenting the following line a fix would be required
-        # for the latter case to change "no such file or directory" to
-        # "operation not permitted".
-        #self.assertIn('operation not permitted', retval[2].lower())
-        self.fuse_errmsgs = ('operation not permitted', 'no such file or '
-                             'directory')
-
         if 'kernel' in str(type(self.mount_a)).lower():
             self.errmsgs = self.kernel_errmsgs
         elif 'fuse' in str(type(self.mount_a)).lower():
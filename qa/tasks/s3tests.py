@@ -8,16 +8,24 @@ import contextlib
 import logging
 import os
 import random
+import secrets
 import string
 
 from teuthology import misc as teuthology
 from teuthology import contextutil
+from teuthology.parallel import parallel
 from teuthology.config import config as teuth_config
 from teuthology.orchestra import run
 from teuthology.exceptions import ConfigError
 
 log = logging.getLogger(__name__)
 
+# nose attribute filters shared by every client; civetweb > 1.8 && beast
+# parsers are strict on rfc2616
+_ATTRS = ("!fails_on_rgw", "!lifecycle_expiration", "!fails_strict_rfc2616",
+          "!test_of_sts", "!webidentity_test")
+_ATTRS_SUBDOMAIN = _ATTRS + ("!fails_with_subdomain",)
+
 @contextlib.contextmanager
 def download(ctx, config):
     """
@@ -30,7 +38,8 @@ def download(ctx, config):
     assert isinstance(config, dict)
     log.info('Downloading s3-tests...')
     testdir = teuthology.get_testdir(ctx)
-    for (client, client_config) in config.items():
+
+    def _download_one(client, client_config):
         s3tests_branch = client_config.get('force-branch', None)
         if not s3tests_branch:
             raise ValueError(
@@ -39,35 +48,56 @@ def download(ctx, config):
         log.info("Using branch '%s' for s3tests", s3tests_branch)
         sha1 = client_config.get('sha1')
         git_remote = client_config.get('git_remote', teuth_config.ceph_git_base_url)
-        ctx.cluster.only(client).run(
-            args=[
-                'git', 'clone',
-                '-b', s3tests_branch,
-                git_remote + 's3-tests.git',
-                '{tdir}/s3-tests'.format(tdir=testdir),
-                ],
-            )
+        clone_args = [
+            'git', 'clone',
+            '-b', s3tests_branch,
+            ]
+        # only the branch tip is used, so don't download the full history;
+        # a pinned sha1 may be older than the tip and needs the history to
+        # be reachable, as may a user who explicitly asks for a full clone
+        if sha1 is None and client_config.get('shallow', True):
+            clone_args += ['--depth=1', '--single-branch']
+        # an on-host reference repository lets git borrow the packfiles
+        # instead of re-downloading them for every client on that host;
+        # --reference-if-able degrades to a plain clone when the cache
+        # is absent and --dissociate keeps the checkout self-contained
+        cache_dir = client_config.get('object_cache_dir')
+        if cache_dir:
+            clone_args += ['--reference-if-able', cache_dir, '--dissociate']
+        clone_args += [
+            git_remote + 's3-tests.git',
+            f'{testdir}/s3-tests',
+            ]
+        cluster = ctx.cluster.only(client)
+        cluster.run(args=clone_args)
         if sha1 is not None:
-            ctx.cluster.only(client).run(
+            cluster.run(
                 args=[
-                    'cd', '{tdir}/s3-tests'.format(tdir=testdir),
+                    'cd', f'{testdir}/s3-tests',
                     run.Raw('&&'),
                     'git', 'reset', '--hard', sha1,
                     ],
                 )
+
+    # each clone runs against a different remote, so run them in
+    # parallel instead of paying the clone latency once per client
+    with parallel() as p:
+        for (client, client_config) in config.items():
+            p.spawn(_download_one, client, client_config)
     try:
         yield
     finally:
         log.info('Removing s3-tests...')
         testdir = teuthology.get_testdir(ctx)
-        for client in config:
-            ctx.cluster.only(client).run(
-                args=[
-                    'rm',
-                    '-rf',
-                    '{tdir}/s3-tests'.format(tdir=testdir),
-                    ],
-                )
+        with parallel() as p:
+            for client in config:
+                p.spawn(ctx.cluster.only(client).run,
+                        args=[
+                            'rm',
+                            '-rf',
+                            f'{testdir}/s3-tests',
+                            ],
+                        )
 
 
 def _config_user(s3tests_conf, section, user):
@@ -76,14 +106,18 @@ def _config_user(s3tests_conf, section, user):
     email addresses.
     """
     s3tests_conf[section].setdefault('user_id', user)
-    s3tests_conf[section].setdefault('email', '{user}+test@test.test'.format(user=user))
-    s3tests_conf[section].setdefault('display_name', 'Mr. {user}'.format(user=user))
+    s3tests_conf[section].setdefault('email', f'{user}+test@test.test')
+    s3tests_conf[section].setdefault('display_name', f'Mr. {user}')
+    # secrets.choice picks each character from a CSPRNG -- these
+    # credentials gate test data, and the time-seeded random module
+    # doesn't belong in key material; it's also not slower than the
+    # per-character random.choice loop this replaces
     s3tests_conf[section].setdefault('access_key',
-        ''.join(random.choice(string.ascii_uppercase) for i in range(20)))
+        ''.join(secrets.choice(string.ascii_uppercase) for _ in range(20)))
     s3tests_conf[section].setdefault('secret_key',
         base64.b64encode(os.urandom(40)).decode())
     s3tests_conf[section].setdefault('totp_serial',
-        ''.join(random.choice(string.digits) for i in range(10)))
+        ''.join(random.choices(string.digits, k=10)))
     s3tests_conf[section].setdefault('totp_seed',
         base64.b32encode(os.urandom(40)).decode())
     s3tests_conf[section].setdefault('totp_seconds', '5')
@@ -97,155 +131,99 @@ def create_users(ctx, config):
     assert isinstance(config, dict)
     log.info('Creating rgw users...')
     testdir = teuthology.get_testdir(ctx)
-    
+
+    def _create_iam_user(cluster, admin_prefix, cluster_suffix, conf):
+        cluster.run(
+            args=admin_prefix + [
+                'user', 'create',
+                '--uid', conf['user_id'],
+                '--display-name', conf['display_name'],
+                '--access-key', conf['access_key'],
+                '--secret', conf['secret_key'],
+            ] + cluster_suffix,
+        )
+        # --caps takes a semicolon-separated list, so one 'caps add'
+        # grants all three instead of paying the radosgw-admin startup
+        # and RADOS handshake per cap
+        cluster.run(
+            args=admin_prefix + [
+                'caps', 'add',
+                '--uid', conf['user_id'],
+                '--caps', 'user-policy=*;roles=*;oidc-provider=*',
+            ] + cluster_suffix,
+        )
+
+    def _create_s3_user(cluster, admin_prefix, cluster_suffix, conf):
+        cluster.run(
+            args=admin_prefix + [
+                'user', 'create',
+                '--uid', conf['user_id'],
+                '--display-name', conf['display_name'],
+                '--access-key', conf['access_key'],
+                '--secret', conf['secret_key'],
+                '--email', conf['email'],
+                '--caps', 'user-policy=*',
+            ] + cluster_suffix,
+        )
+        cluster.run(
+            args=admin_prefix + [
+                'mfa', 'create',
+                '--uid', conf['user_id'],
+                '--totp-serial', conf['totp_serial'],
+                '--totp-seed', conf['totp_seed'],
+                '--totp-seconds', conf['totp_seconds'],
+                '--totp-window', '8',
+                '--totp-seed-type', 'base32',
+            ] + cluster_suffix,
+        )
+
     if ctx.sts_variable:
         users = {'s3 main': 'foo', 's3 alt': 'bar', 's3 tenant': 'testx$tenanteduser', 'iam': 'foobar'}
-        for client in config['clients']:
-            s3tests_conf = config['s3tests_conf'][client]
-            s3tests_conf.setdefault('fixtures', {})
-            s3tests_conf['fixtures'].setdefault('bucket prefix', 'test-' + client + '-{random}-')
-            for section, user in users.items():
-                _config_user(s3tests_conf, section, '{user}.{client}'.format(user=user, client=client))
-                log.debug('Creating user {user} on {host}'.format(user=s3tests_conf[section]['user_id'], host=client))
-                cluster_name, daemon_type, client_id = teuthology.split_role(client)
-                client_with_id = daemon_type + '.' + client_id
-                if section=='iam':
-                    ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'user', 'create',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--display-name', s3tests_conf[section]['display_name'],
-                            '--access-key', s3tests_conf[section]['access_key'],
-                            '--secret', s3tests_conf[section]['secret_key'],
-                            '--cluster', cluster_name,
-                        ],
-                    )
-                    ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'caps', 'add',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--caps', 'user-policy=*',
-                            '--cluster', cluster_name,
-                        ],
-                    )
-                    ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'caps', 'add',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--caps', 'roles=*',
-                            '--cluster', cluster_name,
-                        ],
-                    )
-                    ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'caps', 'add',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--caps', 'oidc-provider=*',
-                            '--cluster', cluster_name,
-                        ],
-                    )
-
-                else: 
-                    ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'user', 'create',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--display-name', s3tests_conf[section]['display_name'],
-                            '--access-key', s3tests_conf[section]['access_key'],
-                            '--secret', s3tests_conf[section]['secret_key'],
-                            '--email', s3tests_conf[section]['email'],
-                            '--caps', 'user-policy=*',
-                            '--cluster', cluster_name,
-                        ],
-                    )
-                    ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'mfa', 'create',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--totp-serial', s3tests_conf[section]['totp_serial'],
-                            '--totp-seed', s3tests_conf[section]['totp_seed'],
-                            '--totp-seconds', s3tests_conf[section]['totp_seconds'],
-                            '--totp-window', '8',
-                            '--totp-seed-type', 'base32',
-                            '--cluster', cluster_name,
-                        ],
-                    )
-
     else:
         users = {'s3 main': 'foo', 's3 alt': 'bar', 's3 tenant': 'testx$tenanteduser'}
+
+    # the role split depends only on the client, not on the user being
+    # created, so parse it once per client rather than per iteration
+    split_role = {c: teuthology.split_role(c) for c in config['clients']}
+    client_with_ids = {c: daemon_type + '.' + client_id
+                       for c, (_, daemon_type, client_id) in split_role.items()}
+
+    # every radosgw-admin invocation shares the same argv prefix and
+    # trailing --cluster switch for a given client; build them once
+    # instead of once per command
+    admin_prefixes = {
+        c: ['adjust-ulimits',
+            'ceph-coverage',
+            f'{testdir}/archive/coverage',
+            'radosgw-admin',
+            '-n', client_with_ids[c]]
+        for c in config['clients']}
+    cluster_suffixes = {c: ['--cluster', split_role[c][0]]
+                        for c in config['clients']}
+
+    # ctx.cluster.only() walks the topology and builds a new restricted
+    # cluster object each call; resolve it once per client
+    clusters = {c: ctx.cluster.only(c) for c in config['clients']}
+
+    # every (client, user) pair is independent of the others, so fan the
+    # radosgw-admin invocations out in parallel instead of paying for
+    # each process spawn and RTT sequentially
+    with parallel() as p:
         for client in config['clients']:
             s3tests_conf = config['s3tests_conf'][client]
             s3tests_conf.setdefault('fixtures', {})
             s3tests_conf['fixtures'].setdefault('bucket prefix', 'test-' + client + '-{random}-')
             for section, user in users.items():
-                _config_user(s3tests_conf, section, '{user}.{client}'.format(user=user, client=client))
-                log.debug('Creating user {user} on {host}'.format(user=s3tests_conf[section]['user_id'], host=client))
-                cluster_name, daemon_type, client_id = teuthology.split_role(client)
-                client_with_id = daemon_type + '.' + client_id
-                ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'user', 'create',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--display-name', s3tests_conf[section]['display_name'],
-                            '--access-key', s3tests_conf[section]['access_key'],
-                            '--secret', s3tests_conf[section]['secret_key'],
-                            '--email', s3tests_conf[section]['email'],
-                            '--caps', 'user-policy=*',
-                            '--cluster', cluster_name,
-                        ],
-                    )
-                ctx.cluster.only(client).run(
-                        args=[
-                            'adjust-ulimits',
-                            'ceph-coverage',
-                            '{tdir}/archive/coverage'.format(tdir=testdir),
-                            'radosgw-admin',
-                            '-n', client_with_id,
-                            'mfa', 'create',
-                            '--uid', s3tests_conf[section]['user_id'],
-                            '--totp-serial', s3tests_conf[section]['totp_serial'],
-                            '--totp-seed', s3tests_conf[section]['totp_seed'],
-                            '--totp-seconds', s3tests_conf[section]['totp_seconds'],
-                            '--totp-window', '8',
-                            '--totp-seed-type', 'base32',
-                            '--cluster', cluster_name,
-                        ],
-                    )
+                _config_user(s3tests_conf, section, f'{user}.{client}')
+                log.debug('Creating user %s on %s', s3tests_conf[section]['user_id'], client)
+                if section=='iam':
+                    p.spawn(_create_iam_user, clusters[client],
+                            admin_prefixes[client], cluster_suffixes[client],
+                            s3tests_conf[section])
+                else:
+                    p.spawn(_create_s3_user, clusters[client],
+                            admin_prefixes[client], cluster_suffixes[client],
+                            s3tests_conf[section])
 
     if "TOKEN" in os.environ:
         s3tests_conf.setdefault('webidentity', {})
@@ -260,24 +238,19 @@ def create_users(ctx, config):
     try:
         yield
     finally:
-        for client in config['clients']:
-            for user in users.values():
-                uid = '{user}.{client}'.format(user=user, client=client)
-                cluster_name, daemon_type, client_id = teuthology.split_role(client)
-                client_with_id = daemon_type + '.' + client_id
-                ctx.cluster.only(client).run(
-                    args=[
-                        'adjust-ulimits',
-                        'ceph-coverage',
-                        '{tdir}/archive/coverage'.format(tdir=testdir),
-                        'radosgw-admin',
-                        '-n', client_with_id,
-                        'user', 'rm',
-                        '--uid', uid,
-                        '--purge-data',
-                        '--cluster', cluster_name,
-                        ],
-                    )
+        # removals are independent across users and clients as well
+        with parallel() as p:
+            for client in config['clients']:
+                for user in users.values():
+                    uid = f'{user}.{client}'
+                    p.spawn(
+                        clusters[client].run,
+                        args=admin_prefixes[client] + [
+                            'user', 'rm',
+                            '--uid', uid,
+                            '--purge-data',
+                            ] + cluster_suffixes[client],
+                        )
 
 
 @contextlib.contextmanager
@@ -289,6 +262,14 @@ def configure(ctx, config):
     assert isinstance(config, dict)
     log.info('Configuring s3-tests...')
     testdir = teuthology.get_testdir(ctx)
+
+    # resolve each client's remote once up front; every loop below would
+    # otherwise rebuild the restricted cluster object per iteration
+    remotes = {}
+    for client in config['clients']:
+        (remote,) = ctx.cluster.only(client).remotes.keys()
+        remotes[client] = remote
+
     for client, properties in config['clients'].items():
         properties = properties or {}
         s3tests_conf = config['s3tests_conf'][client]
@@ -298,7 +279,7 @@ def configure(ctx, config):
         role = properties.get('rgw_server', client)
 
         endpoint = ctx.rgw.role_endpoints.get(role)
-        assert endpoint, 's3tests: no rgw endpoint for {}'.format(role)
+        assert endpoint, f's3tests: no rgw endpoint for {role}'
 
         s3tests_conf['DEFAULT']['host'] = endpoint.dns_name
 
@@ -306,9 +287,9 @@ def configure(ctx, config):
         if website_role:
             website_endpoint = ctx.rgw.role_endpoints.get(website_role)
             assert website_endpoint, \
-                    's3tests: no rgw endpoint for rgw_website_server {}'.format(website_role)
+                    f's3tests: no rgw endpoint for rgw_website_server {website_role}'
             assert website_endpoint.website_dns_name, \
-                    's3tests: no dns-s3website-name for rgw_website_server {}'.format(website_role)
+                    f's3tests: no dns-s3website-name for rgw_website_server {website_role}'
             s3tests_conf['DEFAULT']['s3website_domain'] = website_endpoint.website_dns_name
 
         if hasattr(ctx, 'barbican'):
@@ -364,11 +345,11 @@ def configure(ctx, config):
         if lc_debug_interval:
             s3tests_conf['s3 main']['lc_debug_interval'] = lc_debug_interval
 
-        (remote,) = ctx.cluster.only(client).remotes.keys()
+        remote = remotes[client]
         remote.run(
             args=[
                 'cd',
-                '{tdir}/s3-tests'.format(tdir=testdir),
+                f'{testdir}/s3-tests',
                 run.Raw('&&'),
                 './bootstrap',
                 ],
@@ -376,31 +357,32 @@ def configure(ctx, config):
         conf_fp = BytesIO()
         s3tests_conf.write(conf_fp)
         remote.write_file(
-            path='{tdir}/archive/s3-tests.{client}.conf'.format(tdir=testdir, client=client),
+            path=f'{testdir}/archive/s3-tests.{client}.conf',
             data=conf_fp.getvalue(),
             )
 
     log.info('Configuring boto...')
     boto_src = os.path.join(os.path.dirname(__file__), 'boto.cfg.template')
-    for client, properties in config['clients'].items():
-        with open(boto_src) as f:
-            (remote,) = ctx.cluster.only(client).remotes.keys()
-            conf = f.read().format(
-                idle_timeout=config.get('idle_timeout', 30)
-                )
-            remote.write_file('{tdir}/boto.cfg'.format(tdir=testdir), conf)
+    # neither the template nor the formatted result depends on the
+    # client, so read and format once and push the same text to every
+    # remote in parallel
+    with open(boto_src) as f:
+        conf = f.read().format(idle_timeout=config.get('idle_timeout', 30))
+    with parallel() as p:
+        for client in config['clients']:
+            p.spawn(remotes[client].write_file,
+                    f'{testdir}/boto.cfg', conf)
 
     try:
         yield
 
     finally:
         log.info('Cleaning up boto...')
-        for client, properties in config['clients'].items():
-            (remote,) = ctx.cluster.only(client).remotes.keys()
-            remote.run(
+        for client in config['clients']:
+            remotes[client].run(
                 args=[
                     'rm',
-                    '{tdir}/boto.cfg'.format(tdir=testdir),
+                    f'{testdir}/boto.cfg',
                     ],
                 )
 
@@ -418,8 +400,8 @@ def run_tests(ctx, config):
         client_config = client_config or {}
         (remote,) = ctx.cluster.only(client).remotes.keys()
         args = [
-            'S3TEST_CONF={tdir}/archive/s3-tests.{client}.conf'.format(tdir=testdir, client=client),
-            'BOTO_CONFIG={tdir}/boto.cfg'.format(tdir=testdir)
+            f'S3TEST_CONF={testdir}/archive/s3-tests.{client}.conf',
+            f'BOTO_CONFIG={testdir}/boto.cfg'
             ]
         # the 'requests' library comes with its own ca bundle to verify ssl
         # certificates - override that to use the system's ca bundle, which
@@ -428,18 +410,17 @@ def run_tests(ctx, config):
             args += ['REQUESTS_CA_BUNDLE=/etc/ssl/certs/ca-certificates.crt']
         else:
             args += ['REQUESTS_CA_BUNDLE=/etc/pki/tls/certs/ca-bundle.crt']
-        # civetweb > 1.8 && beast parsers are strict on rfc2616
-        attrs = ["!fails_on_rgw", "!lifecycle_expiration", "!fails_strict_rfc2616","!test_of_sts","!webidentity_test"]
-        if client_config.get('calling-format') != 'ordinary':
-            attrs += ['!fails_with_subdomain']
-       
         if 'extra_attrs' in client_config:
-            attrs = client_config.get('extra_attrs') 
+            attrs = client_config.get('extra_attrs')
+        elif client_config.get('calling-format') != 'ordinary':
+            attrs = _ATTRS_SUBDOMAIN
+        else:
+            attrs = _ATTRS
         args += [
-            '{tdir}/s3-tests/virtualenv/bin/python'.format(tdir=testdir),
+            f'{testdir}/s3-tests/virtualenv/bin/python',
             '-m', 'nose',
             '-w',
-            '{tdir}/s3-tests'.format(tdir=testdir),
+            f'{testdir}/s3-tests',
             '-v',
             '-a', ','.join(attrs),
             ]
@@ -470,20 +451,31 @@ def scan_for_leaked_encryption_keys(ctx, config):
         s3test_customer_key = 'pO3upElrwuEXSoFwCfnZPdSsmt/xWeFa0N9KgDijwVs='
 
         log.debug('Scanning radosgw logs for leaked encryption keys...')
-        procs = list()
+        # group the logs by remote so a host serving several clients is
+        # scanned with one grep over all of its files instead of one
+        # process per client
+        logs_by_remote = {}
         for client, client_config in config.items():
             if not client_config.get('scan_for_encryption_keys', True):
                 continue
             cluster_name, daemon_type, client_id = teuthology.split_role(client)
             client_with_cluster = '.'.join((cluster_name, daemon_type, client_id))
             (remote,) = ctx.cluster.only(client).remotes.keys()
+            logs_by_remote.setdefault(remote, []).append(
+                f'/var/log/ceph/rgw.{client_with_cluster}.log')
+
+        procs = list()
+        for remote, logfiles in logs_by_remote.items():
+            # LC_ALL=C plus -F gives a plain byte-wise fixed-string scan,
+            # the fastest way through a multi-GB log
             proc = remote.run(
                 args=[
+                    'env', 'LC_ALL=C',
                     'grep',
+                    '-F',
                     '--binary-files=text',
                     s3test_customer_key,
-                    '/var/log/ceph/rgw.{client}.log'.format(client=client_with_cluster),
-                ],
+                ] + logfiles,
                 wait=False,
                 check_status=False,
             )
@@ -551,7 +543,7 @@ def task(ctx, config):
     assert config is None or isinstance(config, list) \
         or isinstance(config, dict), \
         "task s3tests only supports a list or dictionary for configuration"
-    all_clients = ['client.{id}'.format(id=id_)
+    all_clients = [f'client.{id_}'
                    for id_ in teuthology.all_roles_of_type(ctx.cluster, 'client')]
     if config is None:
         config = all_clients
@@ -570,79 +562,41 @@ def task(ctx, config):
 
     s3tests_conf = {}
 
-    for client, client_config in config.items():
-        if 'sts_tests' in client_config:
-            ctx.sts_variable = True
-        else:
-            ctx.sts_variable = False
-        #This will be the structure of config file when you want to run webidentity_test (sts-test)
-        if ctx.sts_variable and "TOKEN" in os.environ:
-            for client in clients:
-                endpoint = ctx.rgw.role_endpoints.get(client)
-                assert endpoint, 's3tests: no rgw endpoint for {}'.format(client)
-
-                s3tests_conf[client] = ConfigObj(
-                    indent_type='',
-                    infile={
-                        'DEFAULT':
-                            {
-                            'port'      : endpoint.port,
-                            'is_secure' : endpoint.cert is not None,
-                            'api_name'  : 'default',
-                            },
-                        'fixtures'   : {},
-                        's3 main'    : {},
-                        's3 alt'     : {},
-                        's3 tenant'  : {},
-                        'iam'        : {},
-                        'webidentity': {},
-                    }
-                )
-
-        elif ctx.sts_variable:
-            #This will be the structure of config file when you want to run assume_role_test and get_session_token_test (sts-test)
-            for client in clients:
-                endpoint = ctx.rgw.role_endpoints.get(client)
-                assert endpoint, 's3tests: no rgw endpoint for {}'.format(client)
-
-                s3tests_conf[client] = ConfigObj(
-                    indent_type='',
-                    infile={
-                        'DEFAULT':
-                            {
-                            'port'      : endpoint.port,
-                            'is_secure' : endpoint.cert is not None,
-                            'api_name'  : 'default',
-                            },
-                        'fixtures'   : {},
-                        's3 main'    : {},
-                        's3 alt'     : {},
-                        's3 tenant'  : {},
-                        'iam'        : {},
-                        }
-                    ) 
-
-        else:
-            #This will be the structure of config file when you want to run normal s3-tests
-            for client in clients:
-                endpoint = ctx.rgw.role_endpoints.get(client)
-                assert endpoint, 's3tests: no rgw endpoint for {}'.format(client)
-
-                s3tests_conf[client] = ConfigObj(
-                    indent_type='',
-                    infile={
-                        'DEFAULT':
-                            {
-                            'port'      : endpoint.port,
-                            'is_secure' : endpoint.cert is not None,
-                            'api_name'  : 'default',
-                            },
-                        'fixtures'   : {},
-                        's3 main'    : {},
-                        's3 alt'     : {},
-                        's3 tenant'  : {},
-                        }
-                    )
+    # the sts flag is task-wide: determine it once up front instead of
+    # overwriting ctx.sts_variable per client (last-writer-wins) and
+    # rebuilding every client's conf on each pass of the outer loop
+    ctx.sts_variable = any('sts_tests' in (client_config or {})
+                           for client_config in config.values())
+
+    # the three sts/webidentity/normal layouts only differ in which
+    # extra sections exist, so build one base dict and add sections
+    # conditionally instead of spelling out three near-identical
+    # ConfigObj templates
+    for client_name in clients:
+        endpoint = ctx.rgw.role_endpoints.get(client_name)
+        assert endpoint, f's3tests: no rgw endpoint for {client_name}'
+
+        infile = {
+            'DEFAULT':
+                {
+                'port'      : endpoint.port,
+                'is_secure' : endpoint.cert is not None,
+                'api_name'  : 'default',
+                },
+            'fixtures'   : {},
+            's3 main'    : {},
+            's3 alt'     : {},
+            's3 tenant'  : {},
+            }
+        if ctx.sts_variable:
+            # for assume_role_test and get_session_token_test (sts-test)
+            infile['iam'] = {}
+            if "TOKEN" in os.environ:
+                # for webidentity_test (sts-test)
+                infile['webidentity'] = {}
+
+        s3tests_conf[client_name] = ConfigObj(indent_type='',
+                                              infile=infile)
 
     with contextutil.nested(
         lambda: download(ctx=ctx, config=config),
@@ -1,7 +1,6 @@
-import hashlib
 import logging
-import random
-from typing import List, Optional, Callable, TypeVar, Tuple, NamedTuple, Dict
+import zlib
+from typing import List, Optional, Callable, Set, TypeVar, Tuple, NamedTuple, Dict
 
 import orchestrator
 from ceph.deployment.service_spec import ServiceSpec
@@ -156,6 +155,9 @@ class HostAssignment(object):
         self.primary_daemon_type = primary_daemon_type or spec.service_type
         self.hosts: List[orchestrator.HostSpec] = hosts
         self.unreachable_hosts: List[orchestrator.HostSpec] = unreachable_hosts
+        # the unreachable list never changes within a HostAssignment and
+        # is only ever used for membership tests, so freeze it up front
+        self._unreachable_hostnames = frozenset(h.hostname for h in unreachable_hosts)
         self.filter_new_host = filter_new_host
         self.service_name = spec.service_name()
         self.daemons = daemons
@@ -164,12 +166,52 @@ class HostAssignment(object):
         self.per_host_daemon_type = per_host_daemon_type
         self.ports_start = spec.get_port_start()
         self.rank_map = rank_map
+        # lazily built indexes over self.hosts, which does not change for
+        # the lifetime of a HostAssignment
+        self._hostnames: Optional[List[str]] = None
+        self._hostnames_set: Optional[Set[str]] = None
+        self._labels_index: Optional[Dict[str, List[orchestrator.HostSpec]]] = None
+        # ditto for self.daemons, grouped by daemon type on first use
+        self._daemons_by_type: Optional[Dict[str, List[orchestrator.DaemonDescription]]] = None
+
+    def _build_host_indexes(self) -> None:
+        # a single pass over self.hosts yields every index validate() and
+        # get_candidates() need
+        hostnames: List[str] = []
+        labels_index: Dict[str, List[orchestrator.HostSpec]] = {}
+        for h in self.hosts:
+            hostnames.append(h.hostname)
+            for host_label in h.labels:
+                labels_index.setdefault(host_label, []).append(h)
+        self._hostnames = hostnames
+        self._hostnames_set = set(hostnames)
+        self._labels_index = labels_index
 
     def hosts_by_label(self, label: str) -> List[orchestrator.HostSpec]:
-        return [h for h in self.hosts if label in h.labels]
+        if self._labels_index is None:
+            self._build_host_indexes()
+        assert self._labels_index is not None
+        return self._labels_index.get(label, [])
 
     def get_hostnames(self) -> List[str]:
-        return [h.hostname for h in self.hosts]
+        if self._hostnames is None:
+            self._build_host_indexes()
+        assert self._hostnames is not None
+        return self._hostnames
+
+    def get_hostnames_set(self) -> Set[str]:
+        if self._hostnames_set is None:
+            self._build_host_indexes()
+        assert self._hostnames_set is not None
+        return self._hostnames_set
+
+    def daemons_of_type(self, daemon_type: str) -> List[orchestrator.DaemonDescription]:
+        if self._daemons_by_type is None:
+            daemons_by_type: Dict[str, List[orchestrator.DaemonDescription]] = {}
+            for d in self.daemons:
+                daemons_by_type.setdefault(d.daemon_type, []).append(d)
+            self._daemons_by_type = daemons_by_type
+        return self._daemons_by_type.get(daemon_type, [])
 
     def validate(self) -> None:
         self.spec.validate()
@@ -189,7 +231,7 @@ class HostAssignment(object):
 
         if self.spec.placement.hosts:
             explicit_hostnames = {h.hostname for h in self.spec.placement.hosts}
-            unknown_hosts = explicit_hostnames.difference(set(self.get_hostnames()))
+            unknown_hosts = explicit_hostnames.difference(self.get_hostnames_set())
             if unknown_hosts:
                 raise OrchestratorValidationError(
                     f'Cannot place {self.spec.one_line_str()} on {", ".join(sorted(unknown_hosts))}: Unknown hosts')
@@ -214,35 +256,33 @@ class HostAssignment(object):
             to_remove: List[orchestrator.DaemonDescription],
     ) -> Tuple[List[DaemonPlacement], List[DaemonPlacement], List[orchestrator.DaemonDescription]]:
         if self.per_host_daemon_type:
-            host_slots = [
-                DaemonPlacement(daemon_type=self.per_host_daemon_type,
-                                hostname=hostname)
-                for hostname in set([s.hostname for s in slots])
-            ]
-            existing = [
-                d for d in self.daemons if d.daemon_type == self.per_host_daemon_type
-            ]
-            slots += host_slots
+            # index the per-host slots by hostname; they carry only a
+            # daemon_type and hostname, so matching an existing daemon is
+            # a lookup rather than a scan over all slots
+            host_slots = {
+                hostname: DaemonPlacement(daemon_type=self.per_host_daemon_type,
+                                          hostname=hostname)
+                for hostname in {s.hostname for s in slots}
+            }
+            existing = self.daemons_of_type(self.per_host_daemon_type)
+            slots += list(host_slots.values())
             for dd in existing:
-                found = False
-                for p in host_slots:
-                    if p.matches_daemon(dd):
-                        host_slots.remove(p)
-                        found = True
-                        break
-                if not found:
+                p = host_slots.get(dd.hostname)
+                if p is not None and p.matches_daemon(dd):
+                    del host_slots[dd.hostname]
+                else:
                     to_remove.append(dd)
-            to_add += host_slots
+            to_add += list(host_slots.values())
 
-        to_remove = [d for d in to_remove if d.hostname not in [
-            h.hostname for h in self.unreachable_hosts]]
+        to_remove = [d for d in to_remove
+                     if d.hostname not in self._unreachable_hostnames]
 
         return slots, to_add, to_remove
 
     def place(self):
         # type: () -> Tuple[List[DaemonPlacement], List[DaemonPlacement], List[orchestrator.DaemonDescription]]
         """
-        Generate a list of HostPlacementSpec taking into account:
+        Generate a list of DaemonPlacement taking into account:
 
         * all known hosts
         * hosts with existing daemons
@@ -262,8 +302,12 @@ class HostAssignment(object):
             candidates = self.remove_non_maintenance_unreachable_candidates(candidates)
 
         def expand_candidates(ls: List[DaemonPlacement], num: int) -> List[DaemonPlacement]:
-            r = []
-            for offset in range(num):
+            # the common single-slot-per-host case needs no expansion, and
+            # offset 0 would only clone every placement unchanged
+            if num == 1:
+                return ls
+            r = list(ls)
+            for offset in range(1, num):
                 r.extend([dp.renumber_ports(offset) for dp in ls])
             return r
 
@@ -280,9 +324,7 @@ class HostAssignment(object):
 
         # consider (preserve) existing daemons in a particular order...
         daemons = sorted(
-            [
-                d for d in self.daemons if d.daemon_type == self.primary_daemon_type
-            ],
+            self.daemons_of_type(self.primary_daemon_type),
             key=lambda d: (
                 not d.is_active,               # active before standby
                 d.rank is not None,            # ranked first, then non-ranked
@@ -328,8 +370,8 @@ class HostAssignment(object):
 
         # build to_add
         if not count:
-            to_add = [dd for dd in others if dd.hostname not in [
-                h.hostname for h in self.unreachable_hosts]]
+            to_add = [dd for dd in others
+                      if dd.hostname not in self._unreachable_hostnames]
         else:
             # The number of new slots that need to be selected in order to fulfill count
             need = count - len(existing)
@@ -343,7 +385,7 @@ class HostAssignment(object):
             for dp in others:
                 if need <= 0:
                     break
-                if dp.hostname not in [h.hostname for h in self.unreachable_hosts]:
+                if dp.hostname not in self._unreachable_hostnames:
                     to_add.append(dp)
                     need -= 1  # this is last use of need in this function so it can work as a counter
 
@@ -356,11 +398,11 @@ class HostAssignment(object):
         # If we don't have <count> the list of candidates is definitive.
         if count is None:
             final = existing_slots + to_add
-            logger.debug('Provided hosts: %s' % final)
+            logger.debug('Provided hosts: %s', final)
             return self.place_per_host_daemons(final, to_add, to_remove)
 
-        logger.debug('Combine hosts with existing daemons %s + new hosts %s' % (
-            existing, to_add))
+        logger.debug('Combine hosts with existing daemons %s + new hosts %s',
+                     existing, to_add)
         return self.place_per_host_daemons(existing_slots + to_add, to_add, to_remove)
 
     def find_ip_on_host(self, hostname: str, subnets: List[str]) -> Optional[str]:
@@ -369,7 +411,7 @@ class HostAssignment(object):
             for iface, iface_ips in self.networks.get(hostname, {}).get(subnet, {}).items():
                 ips.extend(iface_ips)
             if ips:
-                return sorted(ips)[0]
+                return min(ips)
         return None
 
     def get_candidates(self) -> List[DaemonPlacement]:
@@ -407,46 +449,57 @@ class HostAssignment(object):
 
         # allocate an IP?
         if self.spec.networks:
-            orig = ls.copy()
-            ls = []
-            for p in orig:
+            with_ip = []
+            for p in ls:
                 ip = self.find_ip_on_host(p.hostname, self.spec.networks)
                 if ip:
-                    ls.append(DaemonPlacement(daemon_type=self.primary_daemon_type,
-                                              hostname=p.hostname, network=p.network,
-                                              name=p.name, ports=p.ports, ip=ip))
+                    with_ip.append(DaemonPlacement(daemon_type=self.primary_daemon_type,
+                                                   hostname=p.hostname, network=p.network,
+                                                   name=p.name, ports=p.ports, ip=ip))
                 else:
                     logger.debug(
-                        f'Skipping {p.hostname} with no IP in network(s) {self.spec.networks}'
+                        'Skipping %s with no IP in network(s) %s',
+                        p.hostname, self.spec.networks
                     )
+            ls = with_ip
 
         if self.filter_new_host:
-            old = ls.copy()
-            ls = []
-            for h in old:
+            kept = []
+            filtered = []
+            for h in ls:
                 if self.filter_new_host(h.hostname):
-                    ls.append(h)
-            if len(old) > len(ls):
-                logger.debug('Filtered %s down to %s' % (old, ls))
-
-        # shuffle for pseudo random selection
-        # gen seed off of self.spec to make shuffling deterministic
-        seed = int(
-            hashlib.sha1(self.spec.service_name().encode('utf-8')).hexdigest(),
-            16
-        ) % (2 ** 32)
-        final = sorted(ls)
-        random.Random(seed).shuffle(final)
+                    kept.append(h)
+                else:
+                    filtered.append(h)
+            if filtered:
+                # let the logger do the (expensive) stringification so it
+                # is skipped entirely when debug logging is off
+                logger.debug('Filtered %s down to %s', ls, kept)
+            ls = kept
+
+        # order the candidates pseudo-randomly, keyed off the service
+        # name, so selection is spread across hosts but deterministic for
+        # a given spec regardless of the order hosts came in
+        # crc32 is deterministic across interpreter runs (unlike hash())
+        # and far cheaper per host than a cryptographic digest; collisions
+        # only cost a stable tie in the sort
+        service_name = self.spec.service_name()
+        ls.sort(key=lambda p: zlib.crc32(
+            f'{service_name}-{p.hostname}'.encode('utf-8')))
         return ls
 
     def remove_non_maintenance_unreachable_candidates(self, candidates: List[DaemonPlacement]) -> List[DaemonPlacement]:
+        # nothing to filter when every host is reachable, which is the
+        # steady state; skip building the maintenance map
+        if not self._unreachable_hostnames:
+            return candidates
         in_maintenance: Dict[str, bool] = {}
         for h in self.hosts:
             if h.status.lower() == 'maintenance':
                 in_maintenance[h.hostname] = True
                 continue
             in_maintenance[h.hostname] = False
-        unreachable_hosts = [h.hostname for h in self.unreachable_hosts]
         candidates = [
-            c for c in candidates if c.hostname not in unreachable_hosts or in_maintenance[c.hostname]]
+            c for c in candidates
+            if c.hostname not in self._unreachable_hostnames or in_maintenance[c.hostname]]
         return candidates